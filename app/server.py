@@ -1,16 +1,29 @@
 import http.server
 import socketserver
 import os
+import stat
 import sys
 import threading
-import select
+import queue
 import logging
-from urllib.parse import urlparse
 from tqdm import tqdm
 import socket
 import re
+import datetime
+import email.utils
 
 UPLOAD_DIRECTORY = "./uploads"
+CHUNK_SIZE = 1024 * 1024
+SENDFILE_CHUNK_SIZE = 1024 * 1024
+PREALLOCATE_MIN_SIZE = 16 * 1024 * 1024
+PREALLOCATE_MAX_SIZE = 1024 * 1024 * 1024
+MAX_PART_HEADER_SIZE = 16 * 1024
+
+# tqdm draws on stderr; skip the progress bar entirely when that isn't a terminal
+_TTY = sys.stderr.isatty()
+
+_SAFE_RE = re.compile(r'[^a-zA-Z0-9.]')
+_FILENAME_RE = re.compile(rb'filename="([^"]*)"')
 
 # Set up logging
 logging.basicConfig(
@@ -22,46 +35,218 @@ logging.basicConfig(
 def sanitize_filename(filename):
     """Sanitize the uploaded filename to allow only alphanumeric characters and one dot."""
     # Remove invalid characters (allow only a-z, A-Z, 0-9, and a single dot)
-    sanitized = re.sub(r'[^a-zA-Z0-9.]', '_', filename)
+    sanitized = _SAFE_RE.sub('_', filename)
     
     # Ensure only one dot is allowed
-    if sanitized.count('.') > 1:
+    if sanitized.find('.') != sanitized.rfind('.'):
         raise ValueError("Filename contains multiple dots.")
     
     return sanitized
 
+def create_temp_file(directory):
+    """Create a uniquely named hidden file in directory and return (fd, path).
+
+    The file is created with mode 0666 like open() does, so the kernel applies
+    the process umask and the final upload gets the usual permissions.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        path = os.path.join(directory, f".upload-{os.urandom(6).hex()}")
+        try:
+            return os.open(path, flags, 0o666), path
+        except FileExistsError:
+            continue
+
+class ThreadPoolMixIn(socketserver.ThreadingMixIn):
+    """Handle requests in a pool of reusable worker threads instead of one thread per request.
+
+    min_workers threads are started up front; more are added whenever every
+    worker is busy, up to max_workers. Surplus workers exit after idling for
+    idle_timeout seconds. Like ThreadingMixIn, server_close waits for
+    in-flight requests unless block_on_close is False.
+    """
+    min_workers = (os.cpu_count() or 1) * 2
+    max_workers = 64
+    idle_timeout = 60
+    block_on_close = True
+    _workers = ()
+
+    def server_activate(self):
+        super().server_activate()
+        self._requests = queue.Queue()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._workers = set()
+        for _ in range(self.min_workers):
+            self._add_worker()
+
+    def _add_worker(self):
+        worker = threading.Thread(target=self._process_requests, daemon=True)
+        self._workers.add(worker)
+        worker.start()
+
+    def _process_requests(self):
+        while True:
+            try:
+                item = self._requests.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                with self._lock:
+                    if len(self._workers) > self.min_workers and self._active < len(self._workers):
+                        self._workers.discard(threading.current_thread())
+                        return
+                continue
+            if item is None:
+                break
+            try:
+                self.process_request_thread(*item)
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self._active += 1
+            # Grow the pool when every worker already has a request
+            if self._active > len(self._workers) and len(self._workers) < self.max_workers:
+                self._add_worker()
+        self._requests.put((request, client_address))
+
+    def server_close(self):
+        super().server_close()
+        workers, self._workers = list(self._workers), set()
+        # Wake every worker with a sentinel so they exit once the queue drains,
+        # then wait for the requests they are still handling
+        for _ in workers:
+            self._requests.put(None)
+        if self.block_on_close:
+            for worker in workers:
+                worker.join()
+
+class ThreadPoolServer(ThreadPoolMixIn, socketserver.TCPServer):
+    # Allow the socket to be reused immediately after the server shuts down
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def get_request(self):
+        conn, addr = super().get_request()
+        # Don't hold back small writes such as headers waiting for more data
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn, addr
+
 class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Drop connections that stall so they can't tie up a pool worker
+    timeout = 30
+
     def copyfile(self, source, outputfile):
         """Copy data from source to outputfile with a progress bar."""
         fs = os.fstat(source.fileno())
         total_size = fs.st_size
 
-        with tqdm(total=total_size, unit="B", unit_scale=True, desc=self.path[1:], ncols=100) as progress:
+        with tqdm(total=total_size, unit="B", unit_scale=True, desc=self.path[1:], ncols=100,
+                  disable=not _TTY) as progress:
+            if outputfile is self.wfile:
+                # Let the kernel copy the file straight into the socket; socket.sendfile
+                # honours the socket timeout and falls back to send() where needed
+                offset = 0
+                while offset < total_size:
+                    sent = self.connection.sendfile(source, offset, min(SENDFILE_CHUNK_SIZE, total_size - offset))
+                    if not sent:
+                        break
+                    offset += sent
+                    progress.update(sent)
+                return
+
+            # Reuse one buffer for every read; at this size the progress bar is
+            # updated at most once per MiB
+            buf = bytearray(CHUNK_SIZE)
+            view = memoryview(buf)
             while True:
-                buf = source.read(64 * 1024)
-                if not buf:
+                n = source.readinto(buf)
+                if not n:
                     break
-                outputfile.write(buf)
-                progress.update(len(buf))
+                outputfile.write(view[:n])
+                progress.update(n)
 
     def send_error(self, code, message=None, explain=None):
-        self.send_response(code)
-        self.end_headers()
+        self._send_simple_response(code)
+
+    def _send_simple_response(self, code, body=b""):
+        """Send a complete response with a single write so it leaves as one segment."""
+        self.log_request(code)
+        self.close_connection = True
+        reason = self.responses.get(code, ("",))[0]
+        head = (
+            f"{self.protocol_version} {code} {reason}\r\n"
+            f"Date: {self.date_time_string()}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        )
+        self.wfile.write(head.encode("latin-1") + body)
 
     def version_string(self):
         return ""
 
-    def do_GET(self):
+    def send_head(self):
+        """Open the requested file and send its headers, using a single fstat.
+
+        Directories are never served, so unlike the base class there is no
+        isdir check up front; a directory is detected from the same fstat.
+        If-Modified-Since is honoured the same way as in the base class.
+        """
         path = self.translate_path(self.path)
-        if os.path.isdir(path):
+        if path.endswith("/"):
             self.send_error(404)
-            return
-        super().do_GET()
+            return None
+
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.send_error(404)
+            return None
+
+        try:
+            fs = os.fstat(f.fileno())
+            if stat.S_ISDIR(fs.st_mode):
+                f.close()
+                self.send_error(404)
+                return None
+
+            # Use browser cache if possible
+            if "If-Modified-Since" in self.headers and "If-None-Match" not in self.headers:
+                try:
+                    ims = email.utils.parsedate_to_datetime(self.headers["If-Modified-Since"])
+                except (TypeError, IndexError, OverflowError, ValueError):
+                    # ignore ill-formed values
+                    pass
+                else:
+                    if ims.tzinfo is None:
+                        # obsolete format with no timezone, cf. RFC 7231 section 7.1.1.1
+                        ims = ims.replace(tzinfo=datetime.timezone.utc)
+                    if ims.tzinfo is datetime.timezone.utc:
+                        # compare to UTC datetime of last modification, without microseconds
+                        last_modif = datetime.datetime.fromtimestamp(fs.st_mtime, datetime.timezone.utc)
+                        if last_modif.replace(microsecond=0) <= ims:
+                            self.send_response(304)
+                            self.end_headers()
+                            f.close()
+                            return None
+
+            self.send_response(200)
+            self.send_header("Content-type", self.guess_type(path))
+            self.send_header("Content-Length", str(fs.st_size))
+            self.send_header("Last-Modified", self.date_time_string(fs.st_mtime))
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
 
     def do_POST(self):
         """Handle POST requests for file uploads."""
-        parsed_path = urlparse(self.path)
-        if parsed_path.path == "/upload":
+        # Only the path matters here, so skip a full urlparse
+        path = self.path.split("?", 1)[0]
+        if path == "/upload":
             content_type = self.headers.get("Content-Type")
             if not content_type or "multipart/form-data" not in content_type:
                 self.send_error(400, "Invalid content type")
@@ -79,76 +264,190 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
 
             logging.info(f"Uploading file..")
 
-            # Read the entire POST data (multipart form data)
-            post_data = self.rfile.read(content_length)
-
-            # Split the data by the boundary to get the individual parts
-            parts = post_data.split(f"--{boundary}".encode())  # Boundary should be in bytes
-
-            # Remove the last part, which is typically the trailing boundary (empty part)
-            if parts[-1] == b'':
-                parts = parts[:-1]
-
-            for part in parts:
-                if b"Content-Disposition: form-data" in part and b'filename="' in part:
-                    # Extract the filename from the part
-                    filename_start = part.find(b'filename="') + 10
-                    filename_end = part.find(b'"', filename_start)
-                    filename = part[filename_start:filename_end].decode("utf-8")
-
-                    # If no filename found, continue to the next part
-                    if not filename:
-                        continue
-
-                    sanitized_filename = sanitize_filename(filename)
-
-                    # Extract the file content (after the headers)
-                    content_start = part.find(b"\r\n\r\n") + 4
-                    file_content = part[content_start:]
-
-                    # Remove any trailing CRLF or boundary markers if present
-                    if file_content.endswith(b"\r\n"):
-                        file_content = file_content[:-2]  # Remove the CRLF (0x0A0D)
-
-                    # Define the file path
-                    os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
-                    file_path = os.path.join(UPLOAD_DIRECTORY, sanitized_filename)
-
-                    # Write the file content to disk (binary mode)
-                    try:
-                        with open(file_path, "wb") as f:
-                            f.write(file_content)
-
-                        # Send success response
-                        self.send_response(201)
-                        self.end_headers()
-                        self.wfile.write(b"File uploaded successfully")
-
-                        # Log the success
-                        logging.info(f"Uploaded {sanitized_filename} successfully")
+            # Stream the body straight to disk instead of buffering it in memory
+            self._remaining = content_length
+            try:
+                sanitized_filename = self._save_upload(boundary.encode())
+                self._discard_body()
+            except ValueError as e:
+                logging.error(f"Rejected upload: {e}")
+                self._discard_body()
+                self.send_error(400, str(e))
+                return
+            except Exception as e:
+                logging.error(f"Error while uploading: {e}")
+                self.send_error(500, "Internal Server Error")
+                return
 
-                    except Exception as e:
-                        logging.error(f"Error while uploading {sanitized_filename}: {e}")
-                        self.send_error(500, "Internal Server Error")
+            # If no file was found in the request, send an error
+            if sanitized_filename is None:
+                self.send_error(400, "No file found in the request")
+                return
 
-                    return
+            # Send success response
+            self._send_simple_response(201, b"File uploaded successfully")
 
-            # If no file was found in the request, send an error
-            self.send_error(400, "No file found in the request")
+            # Log the success
+            logging.info(f"Uploaded {sanitized_filename} successfully")
         else:
             self.send_error(404)
 
+    def _read_chunk(self):
+        """Read the next chunk of the request body, or b"" once it is exhausted."""
+        if self._remaining <= 0:
+            return b""
+        chunk = self.rfile.read(min(CHUNK_SIZE, self._remaining))
+        self._remaining = self._remaining - len(chunk) if chunk else 0
+        return chunk
+
+    def _discard_body(self):
+        """Consume whatever is left of the request body."""
+        while self._read_chunk():
+            pass
+
+    def _read_until(self, buf, pattern, sink=None):
+        """Read the body into buf until pattern is found, then drop it and what precedes it.
+
+        buf is a bytearray consumed in place. Everything before the pattern is
+        passed to sink (or dropped if sink is None). Only a pattern-sized tail
+        is carried across reads, so memory use stays bounded. Returns False if
+        the body ends before the pattern.
+        """
+        while True:
+            index = buf.find(pattern)
+            if index != -1:
+                if sink:
+                    # Hand out a view so the data isn't copied before being written
+                    sink(memoryview(buf)[:index])
+                del buf[:index + len(pattern)]
+                return True
+
+            # Keep just enough bytes to match a pattern split across two reads
+            cut = len(buf) - len(pattern) + 1
+            if cut > 0:
+                if sink:
+                    sink(memoryview(buf)[:cut])
+                del buf[:cut]
+
+            chunk = self._read_chunk()
+            if not chunk:
+                return False
+            buf += chunk
+
+    def _save_upload(self, boundary):
+        """Write the first file part of the multipart body to UPLOAD_DIRECTORY.
+
+        Returns the sanitized filename, or None if the body holds no file.
+        """
+        # Every delimiter is preceded by a CRLF except the very first one, so
+        # seed the buffer with one to match them all with the same pattern.
+        delimiter = b"\r\n--" + boundary
+        buf = bytearray(b"\r\n")
+
+        while True:
+            if not self._read_until(buf, delimiter):
+                return None
+
+            while len(buf) < 2:
+                chunk = self._read_chunk()
+                if not chunk:
+                    return None
+                buf += chunk
+
+            # The closing delimiter is followed by "--"
+            if buf.startswith(b"--"):
+                return None
+
+            header = bytearray()
+
+            def collect_header(data):
+                header.extend(data)
+                if len(header) > MAX_PART_HEADER_SIZE:
+                    raise ValueError("Part headers too large")
+
+            if not self._read_until(buf, b"\r\n\r\n", collect_header):
+                return None
+
+            if b"Content-Disposition: form-data" not in header:
+                continue
+
+            # Extract the filename from the part headers
+            match = _FILENAME_RE.search(header)
+            if not match:
+                continue
+            filename = match.group(1).decode("utf-8", "surrogateescape")
+
+            # If no filename found, continue to the next part
+            if not filename:
+                continue
+
+            sanitized_filename = sanitize_filename(filename)
+
+            # Define the file path
+            file_path = os.path.join(UPLOAD_DIRECTORY, sanitized_filename)
+
+            # Write into a temporary file first so readers never see a partial upload
+            # and a failed upload leaves any existing file with that name untouched
+            try:
+                fd, temp_path = create_temp_file(UPLOAD_DIRECTORY)
+            except FileNotFoundError:
+                # main() normally creates the directory; recreate it if it is missing
+                os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
+                fd, temp_path = create_temp_file(UPLOAD_DIRECTORY)
+            saved = False
+            try:
+                # Write the file content to disk (binary mode) up to the next delimiter.
+                # Body chunks are already large, so write them unbuffered rather than
+                # copying them through a BufferedWriter first
+                with os.fdopen(fd, "wb", buffering=0) as f:
+                    # Reserve space for large uploads up front to limit fragmentation;
+                    # the rest of the body is an upper bound on the file size
+                    preallocated = False
+                    if len(buf) + self._remaining >= PREALLOCATE_MIN_SIZE and hasattr(os, "posix_fallocate"):
+                        # The size comes from the client's Content-Length, so never
+                        # reserve more than a fixed maximum or the free space left
+                        fs = os.statvfs(UPLOAD_DIRECTORY)
+                        size = min(len(buf) + self._remaining, PREALLOCATE_MAX_SIZE, fs.f_bavail * fs.f_frsize)
+                        try:
+                            os.posix_fallocate(fd, 0, size)
+                        except OSError:
+                            pass
+                        preallocated = True
+
+                    def write_all(data):
+                        # Unbuffered writes may be partial
+                        while data:
+                            data = data[f.write(data):]
+
+                    complete = self._read_until(buf, delimiter, write_all)
+
+                    # Give back the space the multipart trailer didn't use
+                    if preallocated:
+                        f.truncate()
+
+                if not complete:
+                    raise ValueError("Upload ended before the closing boundary")
+
+                os.replace(temp_path, file_path)
+                saved = True
+            finally:
+                if not saved:
+                    os.remove(temp_path)
+
+            return sanitized_filename
+
 
 def monitor_keypress(stop_event):
     print("Press 'L' to list the current directory contents.")
     while not stop_event.is_set():
-        ready, _, _ = select.select([sys.stdin], [], [], 0.1)
-        if ready:
-            key = sys.stdin.read(1).strip()
-            if key.upper() == 'L':
-                print("\nCurrent Directory Contents:")
-                for item in sorted(os.listdir('.')):
-                    print(f"  - {item}")
+        # Block until input arrives; the thread is a daemon so it never holds up exit
+        key = sys.stdin.read(1)
+        if not key:
+            break  # stdin was closed, nothing more to read
+        if key.strip().upper() == 'L':
+            print("\nCurrent Directory Contents:")
+            for item in sorted(os.listdir('.')):
+                print(f"  - {item}")
 
 def main():
     if len(sys.argv) > 1:
@@ -167,11 +466,11 @@ def main():
     Handler = CustomHTTPRequestHandler
     
     try:
-        # Create the ThreadingTCPServer to handle multiple requests concurrently
-        with socketserver.ThreadingTCPServer(("", port), Handler) as httpd:
-            # Allow the socket to be reused immediately after the server shuts down
-            httpd.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            
+        # Create the upload directory once instead of on every upload
+        os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
+
+        # Create the ThreadPoolServer to handle multiple requests concurrently
+        with ThreadPoolServer(("", port), Handler) as httpd:
             logging.info(f"Serving on port {port}")
             
             # Start the keypress monitoring thread
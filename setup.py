@@ -1,5 +1,7 @@
 from setuptools import setup, find_packages
-REQUIREMENTS = [i.strip() for i in open("requirements.txt").readlines()]
+
+with open("requirements.txt") as f:
+    REQUIREMENTS = [line.strip() for line in f if line.strip() and not line.startswith("#")]
 
 setup(
     name="armory-http",
@@ -10,7 +12,7 @@ setup(
     author="Sandro",
     url="https://github.com/exgaso/armory-http",
     packages=find_packages(),
-    install_requires=[REQUIREMENTS],
+    install_requires=REQUIREMENTS,
     entry_points={
         "console_scripts": [
             "armory-http=app.server:main",